@@ -4,31 +4,48 @@
 generate_emergency_dispatch_report.py
 生成急救指挥平台需求分析报告（扩展：增加用户分析）并生成示意图（图内为中文，图注含图号与英文翻译）
 - 输出: Mixed_Integer_Emergency_Dispatch_Report.docx
-- 图片: report_images/
+- 图片: 以内存 PNG 直接插入文档；设置 EMRPT_SAVE_IMAGES=1 时同时写出到 report_images/
 
 说明：
 - 本版本在报告中新增“用户分析”小节，并生成“用户角色图（User Roles Diagram）”。
 - 在 CI 上确保已安装中文字体包（workflow 里建议安装 fonts-noto-cjk）。
 依赖:
-  pip install python-docx matplotlib networkx numpy pillow
+  pip install python-docx matplotlib numpy pillow
 用法:
   python tools/generate_emergency_dispatch_report.py
+  公式图按内容缓存于 report_images/.fcache/，设置 EMRPT_NO_CACHE=1 可强制重新渲染。
 """
 import os
+import io
+import copy
 import math
+import hashlib
+import functools
 import datetime
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from docx import Document
 from docx.shared import Inches
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.oxml.shape import CT_Inline
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.image.image import Image as DocxImage
+from docx.parts.image import ImagePart
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 import numpy as np
-import networkx as nx
 from PIL import Image, ImageDraw, ImageFont
 
 OUT_DOCX = "Mixed_Integer_Emergency_Dispatch_Report.docx"
 IMG_DIR = "report_images"
+# 图片默认只在内存中传递给 python-docx；调试时设置 EMRPT_SAVE_IMAGES=1 写出到 IMG_DIR
+SAVE_IMAGES = os.environ.get("EMRPT_SAVE_IMAGES") == "1"
 os.makedirs(IMG_DIR, exist_ok=True)
 
 # 字体候选路径（在 runner/本地系统上查找常见中文字体）
@@ -43,6 +60,7 @@ FONT_CANDIDATES = [
     "./fonts/NotoSansCJK-Regular.ttc",  # 若你把字体上传到仓库 fonts/ 下
 ]
 
+@functools.lru_cache(maxsize=1)
 def find_font_path():
     for p in FONT_CANDIDATES:
         if os.path.exists(p):
@@ -53,42 +71,123 @@ def find_font_path():
         return None
 
 FONT_PATH = find_font_path()
-if FONT_PATH:
-    try:
-        PIL_FONT_DEFAULT = ImageFont.truetype(FONT_PATH, 14)
-    except Exception:
-        PIL_FONT_DEFAULT = ImageFont.load_default()
-else:
-    PIL_FONT_DEFAULT = ImageFont.load_default()
 
+def _pil_font(size):
+    if FONT_PATH:
+        try:
+            return ImageFont.truetype(FONT_PATH, size)
+        except Exception:
+            pass
+    return ImageFont.load_default()
+
+PIL_FONT_DEFAULT = _pil_font(14)
+
+# PIL 示意图按原设计坐标（架构图 1200×700、用户角色图 1000×600）描述，绘制时统一乘以 DIAGRAM_SCALE。
+# 图片以 6 英寸宽插入文档，多余像素只会增加编码与打包开销；调整尺寸只需改这一处
+DIAGRAM_SCALE = 0.6
+# 字号随画布同比缩小，但不低于 10px 以保证中文字形可辨
+DIAGRAM_FONT = _pil_font(max(10, round(14 * DIAGRAM_SCALE)))
+
+def _px(*vals):
+    return tuple(int(round(v * DIAGRAM_SCALE)) for v in vals)
+
+# 按字号缓存 FontProperties；返回对象被共享，调用方不得修改
+@functools.lru_cache(maxsize=8)
 def mpl_fp(size=12):
     if FONT_PATH:
         return fm.FontProperties(fname=FONT_PATH, size=size)
     else:
         return None
 
+# 示意图为大面积纯色，zlib 低压缩级别即可，省下编码 CPU（图片最终会被打包进 docx）
+PNG_SAVE_KW = {"compress_level": 1, "optimize": False}
+# 黑白线框示意图量化为 16 色调色板 PNG，体积约为 RGB 的 1/3~1/5，抗锯齿文字仍清晰
+DIAGRAM_COLORS = 16
+
+def _emit_png(buf, fname):
+    """按需把 PNG 写入 IMG_DIR，并回绕缓冲区供 python-docx 直接读取。"""
+    if SAVE_IMAGES:
+        with open(os.path.join(IMG_DIR, fname), "wb") as f:
+            f.write(buf.getvalue())
+    buf.seek(0)
+    return buf
+
+# 公式统一使用 STIX 数学字体，整个进程只加载这一套 mathtext 字体
+plt.rcParams['mathtext.fontset'] = 'stix'
+
+# 所有 matplotlib 渲染共用同一个 Figure（每次 clf 后重绘），pyplot 状态非线程安全，需加锁
+_FIG = plt.figure(figsize=(8, 5))
+_FIG_LOCK = threading.Lock()
+
+# 公式图按 (公式, 字号, dpi, 画布尺寸) 及决定输出的渲染设置内容寻址缓存，重复运行时跳过 mathtext 渲染
+FORMULA_CACHE_DIR = os.path.join(IMG_DIR, ".fcache")
+# render_formula 的绘制/编码方式（背景、通道、savefig 参数等）改变时递增，使旧缓存失效
+_FORMULA_CACHE_VERSION = 2
+
+def _formula_cache_key(latex, fontsize, dpi, figsize):
+    settings = (_FORMULA_CACHE_VERSION, matplotlib.__version__,
+                plt.rcParams['mathtext.fontset'], sorted(PNG_SAVE_KW.items()))
+    raw = f"{latex}|{fontsize}|{dpi}|{figsize}|{settings}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+# 先写临时文件再原子替换，中断的运行不会留下被当作命中的残缺 PNG；
+# 写缓存失败只告警，不影响已渲染成功的公式
+def _write_formula_cache(cached, data):
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(FORMULA_CACHE_DIR, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, cached)
+    except OSError as e:
+        print(f"[WARN] formula cache write failed for '{cached}': {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
 # 渲染 LaTeX 公式（mathtext 子集），出错时生成占位图，不抛异常
-def render_formula(latex, fname, fontsize=18, dpi=200):
-    path = os.path.join(IMG_DIR, fname)
+# 画布尺寸固定（宽度与插入宽度 6 英寸一致，上下留白即为边距），不用 bbox_inches='tight' 的二次渲染裁剪
+def render_formula(latex, fname, fontsize=18, dpi=120, figsize=(6, 0.6)):
+    buf = io.BytesIO()
+    use_cache = os.environ.get("EMRPT_NO_CACHE") != "1"
+    key = _formula_cache_key(latex, fontsize, dpi, figsize)
+    cached = os.path.join(FORMULA_CACHE_DIR, key + ".png")
+    if use_cache and os.path.exists(cached):
+        with open(cached, "rb") as f:
+            buf.write(f.read())
+        return _emit_png(buf, fname)
     try:
-        fig = plt.figure(figsize=(0.01, 0.01))
-        fig.text(0.5, 0.5, f"${latex}$", ha='center', va='center', fontsize=fontsize)
-        plt.axis('off')
-        fig.savefig(path, dpi=dpi, bbox_inches='tight', pad_inches=0.1, transparent=True)
-        plt.close(fig)
+        with _FIG_LOCK:
+            _FIG.clf()
+            _FIG.set_size_inches(*figsize)
+            _FIG.set_dpi(dpi)
+            _FIG.text(0.5, 0.5, f"${latex}$", ha='center', va='center', fontsize=fontsize)
+            _FIG.canvas.draw()
+            # 白底页面上 alpha 通道不可见，转为 RGB 再编码，省去 alpha 的压缩开销
+            img = Image.fromarray(np.asarray(_FIG.canvas.buffer_rgba())).convert("RGB")
+        img.save(buf, "PNG", dpi=(dpi, dpi), **PNG_SAVE_KW)
     except Exception as e:
         print(f"[WARN] render_formula failed for '{latex}': {e}")
         w, h = 900, 140
         img = Image.new("RGB", (w, h), "white")
         draw = ImageDraw.Draw(img)
         draw.text((20, 50), "公式渲染失败，请查看 CI 日志", fill="black", font=PIL_FONT_DEFAULT)
-        img.save(path)
-    return path
+        buf = io.BytesIO()
+        img.save(buf, "PNG", **PNG_SAVE_KW)
+        return _emit_png(buf, fname)
+    if use_cache:
+        _write_formula_cache(cached, buf.getvalue())
+    return _emit_png(buf, fname)
+
+# 段落列表拼成纯文本，仅供单独调试查看；生成报告时直接逐段插入
+def to_text(parts):
+    return "\n\n".join(parts)
 
 # ----- 新增：用户分析文本生成函数 -----
 def generate_user_analysis():
     """
-    返回用户分析章节文本（中文），包含用户画像、需求与痛点、优先级与权限说明。
+    返回用户分析章节的段落列表（中文），包含用户画像、需求与痛点、优先级与权限说明。
     该文本长度适中，可作为插入到报告中的单独小节。
     """
     parts = []
@@ -136,24 +235,47 @@ def generate_user_analysis():
         "对用户数据访问实施细粒度权限控制：调度员按角色分层，医院按机构权限访问病历相关字段；所有敏感操作均需审计日志，"
         "并在传输/存储中对个人识别信息进行加密或脱敏处理以满足合规要求。"
     )
-    return "\n\n".join(parts)
+    return parts
+
+# 箭头头部半角固定为 0.28 rad：把单位方向向量旋转 ±0.28 即得两个端点，无需 atan2/cos/sin
+_ARROW_COS = math.cos(0.28)
+_ARROW_SIN = math.sin(0.28)
+
+def _arrowhead(x2, y2, dx, dy, l=12):
+    inv = 1.0 / math.hypot(dx, dy)
+    ux, uy = dx*inv, dy*inv
+    c, s = _ARROW_COS, _ARROW_SIN
+    return [(x2, y2),
+            (x2 - l*(ux*c + uy*s), y2 - l*(uy*c - ux*s)),
+            (x2 - l*(ux*c - uy*s), y2 - l*(uy*c + ux*s))]
+
+def _draw_arrow(draw, x1, y1, x2, y2, l=12):
+    draw.line((x1, y1, x2, y2), fill="black", width=3)
+    # 零长度箭头没有方向，只画线不画箭头
+    if x1 == x2 and y1 == y2:
+        return
+    draw.polygon(_arrowhead(x2, y2, x2-x1, y2-y1, l), fill="black")
+
+# 轴对齐方框的边框直接用 uint8 数组切片赋值画出（与 ImageDraw.rectangle(width=2) 逐像素一致），
+# 文字与箭头仍交给 PIL 绘制
+def _boxes_canvas(w, h, rects, width=2):
+    arr = np.full((h, w, 3), 255, dtype=np.uint8)
+    for x0, y0, x1, y1 in rects:
+        arr[y0:y0+width, x0:x1+1] = 0
+        arr[y1-width+1:y1+1, x0:x1+1] = 0
+        arr[y0:y1+1, x0:x0+width] = 0
+        arr[y0:y1+1, x1-width+1:x1+1] = 0
+    return Image.fromarray(arr)
 
 # ----- 新增：生成用户角色图 -----
-def draw_user_roles(fname, figno="图2-11"):
+def draw_user_roles(fname, figno="图2-11", font=DIAGRAM_FONT):
     """
     使用 PIL 绘制用户角色图，文本为中文并包含简短英文标签。
-    返回图片路径。
+    返回内存中的 PNG（BytesIO）。
     """
-    w, h = 1000, 600
-    img = Image.new("RGB", (w, h), "white")
-    draw = ImageDraw.Draw(img)
-    font = PIL_FONT_DEFAULT
-
+    w, h = _px(1000, 600)
     # 中心系统块
     sys_box = (380, 200, 620, 340)
-    draw.rectangle(sys_box, outline="black", width=2)
-    draw.multiline_text((sys_box[0]+10, sys_box[1]+10), "急救指挥平台\n(Dispatch Platform)", font=font, fill="black")
-
     roles = [
         ("呼叫者\n(Caller)", 100, 60),
         ("调度员\n(Dispatcher)", 100, 460),
@@ -161,21 +283,17 @@ def draw_user_roles(fname, figno="图2-11"):
         ("医院/急诊\n(Hospital)", 860, 460),
         ("系统管理员\n(Admin)", 500, 20)
     ]
-    # draw role boxes
+    img = _boxes_canvas(w, h, [_px(*sys_box)] + [_px(x, y, x+180, y+80) for _, x, y in roles])
+    draw = ImageDraw.Draw(img)
+    draw.multiline_text(_px(sys_box[0]+10, sys_box[1]+10), "急救指挥平台\n(Dispatch Platform)", font=font, fill="black")
+
+    # role labels
     for label, x, y in roles:
-        draw.rectangle([x, y, x+180, y+80], outline="black", width=2)
-        draw.multiline_text((x+8, y+8), label, font=font, fill="black")
+        draw.multiline_text(_px(x+8, y+8), label, font=font, fill="black")
 
     # arrows from roles to system
     def arr(x1,y1,x2,y2):
-        draw.line((x1,y1,x2,y2), fill="black", width=3)
-        ang = math.atan2(y2-y1, x2-x1)
-        l = 12
-        x3 = x2 - l*math.cos(ang - 0.28)
-        y3 = y2 - l*math.sin(ang - 0.28)
-        x4 = x2 - l*math.cos(ang + 0.28)
-        y4 = y2 - l*math.sin(ang + 0.28)
-        draw.polygon([(x2,y2),(x3,y3),(x4,y4)], fill="black")
+        _draw_arrow(draw, *_px(x1, y1, x2, y2), l=12*DIAGRAM_SCALE)
 
     arr(190,100,380,270)   # caller -> platform
     arr(190,500,380,270)   # dispatcher -> platform
@@ -184,17 +302,15 @@ def draw_user_roles(fname, figno="图2-11"):
     arr(540,20,540,200)    # admin -> platform
 
     # title
-    draw.text((20, 10), f"{figno} 用户角色图 / Figure {figno.replace('图','')}: User Roles Diagram", font=font, fill="black")
-    path = os.path.join(IMG_DIR, fname)
-    img.save(path)
-    return path
+    draw.text(_px(20, 10), f"{figno} 用户角色图 / Figure {figno.replace('图','')}: User Roles Diagram", font=font, fill="black")
+    img = img.convert("P", palette=Image.Palette.ADAPTIVE, colors=DIAGRAM_COLORS)
+    buf = io.BytesIO()
+    img.save(buf, "PNG", **PNG_SAVE_KW)
+    return _emit_png(buf, fname)
 
 # 其余已有绘图函数（复用之前版本，保留 figno 支持）
-def draw_system_architecture(fname, figno="图2-2"):
-    w, h = 1200, 700
-    img = Image.new("RGB", (w, h), "white")
-    draw = ImageDraw.Draw(img)
-    font = PIL_FONT_DEFAULT
+def draw_system_architecture(fname, figno="图2-2", font=DIAGRAM_FONT):
+    w, h = _px(1200, 700)
     boxes = [
         ("呼叫受理\n(ASR/NLP)", 50, 50),
         ("事件生成\n(Event)", 420, 50),
@@ -206,28 +322,41 @@ def draw_system_architecture(fname, figno="图2-2"):
         ("医院接口\n(HIS)", 420, 520),
     ]
     box_w, box_h = 300, 140
+    img = _boxes_canvas(w, h, [_px(x, y, x+box_w, y+box_h) for _, x, y in boxes])
+    draw = ImageDraw.Draw(img)
     for label, x, y in boxes:
-        draw.rectangle([x, y, x+box_w, y+box_h], outline="black", width=2)
-        draw.multiline_text((x+12, y+16), label, fill="black", font=font, spacing=4)
+        draw.multiline_text(_px(x+12, y+16), label, fill="black", font=font, spacing=4)
     def arrow(x1, y1, x2, y2):
-        draw.line((x1, y1, x2, y2), fill="black", width=3)
-        ang = math.atan2(y2-y1, x2-x1)
-        l = 14
-        x3 = x2 - l*math.cos(ang - 0.28)
-        y3 = y2 - l*math.sin(ang - 0.28)
-        x4 = x2 - l*math.cos(ang + 0.28)
-        y4 = y2 - l*math.sin(ang + 0.28)
-        draw.polygon([(x2, y2), (x3, y3), (x4, y4)], fill="black")
+        _draw_arrow(draw, *_px(x1, y1, x2, y2), l=14*DIAGRAM_SCALE)
     arrow(370, 120, 420, 120)
     arrow(730, 120, 790, 120)
     arrow(210, 200, 210, 300)
     arrow(560, 200, 560, 300)
     arrow(980, 200, 980, 300)
     arrow(560, 450, 560, 520)
-    draw.text((30, 10), f"{figno} 系统总体架构图 / Figure {figno.replace('图','')}: System Architecture", font=font, fill="black")
-    path = os.path.join(IMG_DIR, fname)
-    img.save(path)
-    return path
+    draw.text(_px(30, 10), _arch_title(figno), font=font, fill="black")
+    img = img.convert("P", palette=Image.Palette.ADAPTIVE, colors=DIAGRAM_COLORS)
+    buf = io.BytesIO()
+    img.save(buf, "PNG", **PNG_SAVE_KW)
+    return _emit_png(buf, fname)
+
+def _arch_title(figno):
+    return f"{figno} 系统总体架构图 / Figure {figno.replace('图','')}: System Architecture"
+
+def stamp_figno(base, figno, fname, font=DIAGRAM_FONT):
+    """
+    复用已渲染的架构图 PNG（BytesIO），仅覆盖顶部标题行（图号），避免重新绘制整幅图。
+    返回内存中的 PNG（BytesIO）。
+    """
+    img = Image.open(io.BytesIO(base.getvalue())).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    # 标题行位于方框（设计坐标 y=50 起）之上，先刷白再写入新图号
+    draw.rectangle([0, 0, img.width, _px(50)[0] - 2], fill="white")
+    draw.text(_px(30, 10), _arch_title(figno), font=font, fill="black")
+    img = img.convert("P", palette=Image.Palette.ADAPTIVE, colors=DIAGRAM_COLORS)
+    buf = io.BytesIO()
+    img.save(buf, "PNG", **PNG_SAVE_KW)
+    return _emit_png(buf, fname)
 
 # 其余绘图函数略（在实际脚本中保留之前实现），为简洁此处不重复全部实现
 # 为保证报告完整性，下面仍调用之前实现的函数 names if present.
@@ -237,7 +366,76 @@ def generate_long_content():
     parts = []
     parts.append("需求分析（扩展）\n")
     parts.append("（完整的 5000 字文本请使用脚本先前版本中的 generate_long_content 实现；本脚本已在仓库中保留完整文本。）")
-    return "\n\n".join(parts)
+    return parts
+
+# 批量插入正文段落：直接构造 w:p 并插到 sectPr 之前，绕开逐段 add_paragraph 的封装开销
+def add_paragraphs(doc, paras, space_after=Inches(0.06)):
+    body = doc.element.body
+    sect_pr = body.sectPr
+    ppr = OxmlElement("w:pPr")
+    spacing = OxmlElement("w:spacing")
+    spacing.set(qn("w:after"), str(space_after.twips))
+    ppr.append(spacing)
+    for text in paras:
+        p = OxmlElement("w:p")
+        p.append(copy.deepcopy(ppr))
+        r = OxmlElement("w:r")
+        # 与 add_paragraph 一致：段内换行转为 w:br
+        for i, line in enumerate(text.split("\n")):
+            if i:
+                r.append(OxmlElement("w:br"))
+            if line:
+                t = OxmlElement("w:t")
+                t.set(qn("xml:space"), "preserve")
+                t.text = line
+                r.append(t)
+        p.append(r)
+        if sect_pr is not None:
+            sect_pr.addprevious(p)
+        else:
+            body.append(p)
+
+# 一次性登记全部图片：逐张 add_picture 每次都要查重并重新扫描整篇 XML 求下一个 shape id。
+# 这里按 sha1 去重（相同图片共用一个 ImagePart 与 rId），partname 取最小未占用编号（与 python-docx 一致），
+# 返回 (rId, 文件名, cx, cy) 列表（无法识别的图片为 None），inline 元素在插入时再生成
+def register_pictures(doc, pngs, width=Inches(6)):
+    image_parts = doc.part.package.image_parts
+    by_sha1 = {part.sha1: part for part in image_parts}
+    used_idx = {part.partname.idx for part in image_parts}
+    next_idx = 1
+    pictures = []
+    for png in pngs:
+        try:
+            image = DocxImage.from_file(png)
+        except Exception:
+            pictures.append(None)
+            continue
+        part = by_sha1.get(image.sha1)
+        if part is None:
+            # 已有文档的图片编号可能不连续（如 image1、image3），跳过已占用的编号
+            while next_idx in used_idx:
+                next_idx += 1
+            part = ImagePart.from_image(image, PackURI("/word/media/image%d.%s" % (next_idx, image.ext)))
+            image_parts.append(part)
+            by_sha1[image.sha1] = part
+            used_idx.add(next_idx)
+        rId = doc.part.relate_to(part, RT.IMAGE)
+        cx, cy = image.scaled_dimensions(width, None)
+        pictures.append((rId, image.filename, cx, cy))
+    return pictures
+
+def add_inline_picture(doc, picture, shape_id, label):
+    if picture is None:
+        doc.add_paragraph(f"[无法插入图片：{label}]")
+        return
+    rId, filename, cx, cy = picture
+    inline = CT_Inline.new_pic_inline(shape_id, rId, filename, cx, cy)
+    doc.add_paragraph().add_run()._r.add_drawing(inline)
+
+# 进程池入口：顶层函数才能被 pickle，按函数名分发到本模块的绘图函数
+def _render(job):
+    key, fn_name, args = job
+    return key, globals()[fn_name](*args)
 
 def create_report():
     doc = Document()
@@ -247,56 +445,93 @@ def create_report():
 
     # 插入扩展需求分析正文（之前生成的详细文本）
     doc.add_heading("需求分析（扩展）", level=1)
-    long_text = generate_long_content()
-    for para in long_text.split("\n\n"):
-        p = doc.add_paragraph(para)
-        p.paragraph_format.space_after = Inches(0.06)
+    add_paragraphs(doc, generate_long_content())
 
     # 新增：用户分析小节
     doc.add_heading("用户分析", level=1)
-    user_analysis = generate_user_analysis()
-    for para in user_analysis.split("\n\n"):
-        p = doc.add_paragraph(para)
-        p.paragraph_format.space_after = Inches(0.06)
+    add_paragraphs(doc, generate_user_analysis())
 
     doc.add_page_break()
     doc.add_heading("图示与说明", level=1)
 
     # 生成并插入图片（包括新的用户角色图）
-    imgs = []
-    imgs.append(("图2-2 系统总体架构图 / Figure 2-2: System Architecture", draw_system_architecture("fig2-2_system_architecture.png", "图2-2")))
-    imgs.append(("图2-3 呼叫受理与事件生成流程图 / Figure 2-3: Call Intake and Event Generation Flow", draw_system_architecture("fig2-3_call_flow.png", "图2-3")))  # placeholder reuse if needed
-    imgs.append(("图2-4 任务分配决策流程图 / Figure 2-4: Task Allocation Decision Flow", draw_system_architecture("fig2-4_task_allocation.png", "图2-4")))
-    imgs.append(("图2-5 GIS 资源热力图示意 / Figure 2-5: GIS Resource Heatmap", draw_system_architecture("fig2-5_gis_heatmap.png", "图2-5")))
-    imgs.append(("图2-6 实时路径规划与重规划示意 / Figure 2-6: Real-time Routing & Re-routing", draw_system_architecture("fig2-6_routing.png", "图2-6")))
-    imgs.append(("图2-7 车辆调度甘特图示例 / Figure 2-7: Vehicle Dispatch Gantt Chart", draw_system_architecture("fig2-7_gantt.png", "图2-7")))
-    imgs.append(("图2-8 部署与高可用拓扑图 / Figure 2-8: Deployment Topology", draw_system_architecture("fig2-8_deployment.png", "图2-8")))
-    imgs.append(("图2-9 历史热点时空分析 / Figure 2-9: Historical Hotspot Analysis", draw_system_architecture("fig2-9_hotspot.png", "图2-9")))
+    # 架构图只渲染一次，其余占位图在其基础上改写图号
+    arch_fname = "fig2-2_system_architecture.png"
+    placeholders = [
+        ("图2-3 呼叫受理与事件生成流程图 / Figure 2-3: Call Intake and Event Generation Flow", "fig2-3_call_flow.png", "图2-3"),
+        ("图2-4 任务分配决策流程图 / Figure 2-4: Task Allocation Decision Flow", "fig2-4_task_allocation.png", "图2-4"),
+        ("图2-5 GIS 资源热力图示意 / Figure 2-5: GIS Resource Heatmap", "fig2-5_gis_heatmap.png", "图2-5"),
+        ("图2-6 实时路径规划与重规划示意 / Figure 2-6: Real-time Routing & Re-routing", "fig2-6_routing.png", "图2-6"),
+        ("图2-7 车辆调度甘特图示例 / Figure 2-7: Vehicle Dispatch Gantt Chart", "fig2-7_gantt.png", "图2-7"),
+        ("图2-8 部署与高可用拓扑图 / Figure 2-8: Deployment Topology", "fig2-8_deployment.png", "图2-8"),
+        ("图2-9 历史热点时空分析 / Figure 2-9: Historical Hotspot Analysis", "fig2-9_hotspot.png", "图2-9"),
+    ]
+    # 公式（兼容 mathtext）
+    latex1 = r"\min \sum_{v\in V}\sum_{(i,j)\in A} c_{ij} x_{v,ij} + \beta \sum_{r\in R}\sum_{h\in H_r} P_{r,h} y_{r,h}"
+    latex2 = r"u_{v,j} \geq u_{v,i} + s_i + t_{ij} - M(1-x_{v,ij})"
+    # 各图互相独立，以 (key, 函数名, 参数) 描述；占位图依赖架构图，待其完成后再生成
+    arch_job = (arch_fname, "draw_system_architecture", (arch_fname, "图2-2"))
+    jobs = [
+        ("fig2-11_user_roles.png", "draw_user_roles", ("fig2-11_user_roles.png", "图2-11")),
+        ("formula_obj.png", "render_formula", (latex1, "formula_obj.png", 18)),
+        ("formula_time.png", "render_formula", (latex2, "formula_time.png", 18)),
+    ]
+    def stamp_jobs(arch_png):
+        return [(fname, "stamp_figno", (arch_png, figno, fname)) for _, fname, figno in placeholders]
+
+    if multiprocessing.get_start_method() == "fork":
+        # fork 出的子进程直接继承父进程已导入的模块与缓存
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+            arch_future = ex.submit(_render, arch_job)
+            futures = [ex.submit(_render, job) for job in jobs]
+            _, arch_png = arch_future.result()
+            futures += [ex.submit(_render, job) for job in stamp_jobs(arch_png)]
+            rendered = {arch_fname: arch_png}
+            for fut in as_completed(futures):
+                key, png = fut.result()
+                rendered[key] = png
+    else:
+        # spawn（Windows/macOS 默认）下每个子进程都要重新导入 matplotlib 等依赖，
+        # 启动开销远超并行收益，直接在本进程串行渲染
+        _, arch_png = _render(arch_job)
+        rendered = {arch_fname: arch_png}
+        rendered.update(_render(job) for job in jobs + stamp_jobs(arch_png))
+
+    imgs = [("图2-2 系统总体架构图 / Figure 2-2: System Architecture", rendered[arch_fname])]
+    imgs += [(caption, rendered[fname]) for caption, fname, _ in placeholders]
     # 新增用户角色图
-    imgs.append(("图2-11 用户角色图 / Figure 2-11: User Roles Diagram", draw_user_roles("fig2-11_user_roles.png", "图2-11")))
+    imgs.append(("图2-11 用户角色图 / Figure 2-11: User Roles Diagram", rendered["fig2-11_user_roles.png"]))
 
-    for caption, path in imgs:
-        doc.add_heading(caption.split(" / ")[0], level=3)
-        try:
-            doc.add_picture(path, width=Inches(6))
-        except Exception:
-            doc.add_paragraph(f"[无法插入图片：{path}]")
-        doc.add_paragraph(caption, style='Intense Quote')
+    formulas = [
+        ("式 1：调度目标函数示例（行驶成本 + 医院偏好惩罚）", rendered["formula_obj.png"]),
+        ("式 2：时间窗与 Big-M 线性化约束示例", rendered["formula_time.png"]),
+    ]
+    pictures = register_pictures(doc, [png for _, png in imgs + formulas])
 
-    # 插入公式（兼容 mathtext）
-    latex1 = r"\min \sum_{v\in V}\sum_{(i,j)\in A} c_{ij} x_{v,ij} + \beta \sum_{r\in R}\sum_{h\in H_r} P_{r,h} y_{r,h}"
-    path1 = render_formula(latex1, "formula_obj.png", fontsize=18)
-    doc.add_picture(path1, width=Inches(6))
-    doc.add_paragraph("式 1：调度目标函数示例（行驶成本 + 医院偏好惩罚）", style='Intense Quote')
+    # shape id 在插入开始时扫描一次，之后顺序递增：前提是下面的循环里只新增图片、标题与题注段落，
+    # 后两者不带 @id；若在循环中插入其他带 id 的元素，需改为逐张读取 doc.part.next_id
+    shape_id = doc.part.next_id
+    for (caption, _), picture in zip(imgs, pictures):
+        label = caption.split(" / ")[0]
+        doc.add_heading(label, level=3)
+        add_inline_picture(doc, picture, shape_id, label)
+        shape_id += 1
+        doc.add_paragraph(caption, style='Intense Quote')
 
-    latex2 = r"u_{v,j} \geq u_{v,i} + s_i + t_{ij} - M(1-x_{v,ij})"
-    path2 = render_formula(latex2, "formula_time.png", fontsize=18)
-    doc.add_picture(path2, width=Inches(6))
-    doc.add_paragraph("式 2：时间窗与 Big-M 线性化约束示例", style='Intense Quote')
+    # 插入公式
+    for (caption, _), picture in zip(formulas, pictures[len(imgs):]):
+        add_inline_picture(doc, picture, shape_id, caption)
+        shape_id += 1
+        doc.add_paragraph(caption, style='Intense Quote')
 
-    doc.save(OUT_DOCX)
+    # 1 MiB 写缓冲减少 zip 输出的系统调用次数，结束时只 fsync 一次
+    with open(OUT_DOCX, "wb", buffering=1 << 20) as f:
+        doc.save(f)
+        f.flush()
+        os.fsync(f.fileno())
     print("已生成 Word 报告：", OUT_DOCX)
-    print("图像文件位于：", IMG_DIR)
+    if SAVE_IMAGES:
+        print("图像文件位于：", IMG_DIR)
 
 if __name__ == "__main__":
     create_report()